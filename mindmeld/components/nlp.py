@@ -1262,19 +1262,30 @@ class IntentProcessor(Processor):
                             break
         return aligned_entities
 
-    def _classify_and_resolve_entities(
-        self, idx, query, processed_entities, aligned_entities, verbose=False
-    ):
+    def _classify_roles(self, query, processed_entities, verbose=False):
+        """Runs role classification on the entities, batching the entities of each type together.
+
+        Returns:
+            list: The role confidence scores for each entity.
+        """
+        type_to_indices = {}
+        for idx, entity in enumerate(processed_entities):
+            type_to_indices.setdefault(entity.entity.type, []).append(idx)
+
+        role_confidence = [None] * len(processed_entities)
+        for entity_type, indices in type_to_indices.items():
+            confidence_scores = self.entities[entity_type].process_entities(
+                query, processed_entities, indices, verbose
+            )
+            for idx, confidence_score in zip(indices, confidence_scores):
+                role_confidence[idx] = confidence_score
+        return role_confidence
+
+    def _resolve_entity(self, idx, processed_entities, aligned_entities):
         entity = processed_entities[idx]
-        # Run the role classification
-        entity, role_confidence = self.entities[entity.entity.type].process_entity(
-            query, processed_entities, idx, verbose
-        )
-        # Run the entity resolution
-        entity = self.entities[entity.entity.type].resolve_entity(
+        return self.entities[entity.entity.type].resolve_entity(
             entity, aligned_entities[idx]
         )
-        return [entity, role_confidence]
 
     def _process_entities(self, query, entities, aligned_entities, verbose=False):
         """
@@ -1294,17 +1305,16 @@ class IntentProcessor(Processor):
             query = query[0]
 
         processed_entities = [deepcopy(e) for e in entities[0]]
-        processed_entities_conf = self._process_list(
-            range(len(processed_entities)),
-            "_classify_and_resolve_entities",
-            *[query, processed_entities, aligned_entities, verbose]
+        # Run the role classification
+        role_confidence = self._classify_roles(query, processed_entities, verbose)
+        # Run the entity resolution
+        processed_entities = list(
+            self._process_list(
+                range(len(processed_entities)),
+                "_resolve_entity",
+                *[processed_entities, aligned_entities]
+            )
         )
-        if processed_entities_conf:
-            processed_entities, role_confidence = [
-                list(tup) for tup in zip(*processed_entities_conf)
-            ]
-        else:
-            role_confidence = []
         # Run the entity parsing
         processed_entities = (
             self.parser.parse_entities(query, processed_entities)
@@ -1501,22 +1511,44 @@ class EntityProcessor(Processor):
                         input entity.
                 * confidence_score: confidence scores returned by classifier.
         """
-        self._check_ready()
-        entity = entities[entity_index]
-        confidence_score = None
+        confidence_scores = self.process_entities(
+            query, entities, [entity_index], verbose=verbose
+        )
+        return entities[entity_index], confidence_scores[0]
+
+    def process_entities(self, query, entities, entity_indices, verbose=False):
+        """Processes the given entities of this entity type using the hierarchy of natural \
+        language processing models trained for this entity type. The entities are updated in \
+        place.
 
-        if self.role_classifier.roles:
+        Args:
+            query (Query): The query the entities originated from.
+            entities (list): All entities recognized in the query.
+            entity_indices (list of int): The indices of the entities to process.
+            verbose (bool): If set to True, returns confidence scores of classes.
+
+        Returns:
+            (list): The confidence scores returned by the classifier for each entity, or None \
+                for each entity if not verbose.
+        """
+        self._check_ready()
+        confidence_scores = [None] * len(entity_indices)
+        if not self.role_classifier.roles:
             # Only run role classifier if there are roles!
-            if verbose:
-                role = self.role_classifier.predict_proba(query, entities, entity_index)
-                entity.entity.role = role[0][0]
-                confidence_score = dict(role)
-            else:
-                entity.entity.role = self.role_classifier.predict(
-                    query, entities, entity_index
-                )
+            return confidence_scores
 
-        return entity, confidence_score
+        if verbose:
+            for i, entity_index in enumerate(entity_indices):
+                role = self.role_classifier.predict_proba(query, entities, entity_index)
+                entities[entity_index].entity.role = role[0][0]
+                confidence_scores[i] = dict(role)
+        else:
+            roles = self.role_classifier.predict_batch(
+                [(query, entities, entity_index) for entity_index in entity_indices]
+            )
+            for entity_index, role in zip(entity_indices, roles or []):
+                entities[entity_index].entity.role = role
+        return confidence_scores
 
     def resolve_entity(self, entity, aligned_entity_spans=None):
         """Does the resolution of a single entity. If aligned_entity_spans is not None,
@@ -15,8 +15,11 @@
 This module contains the role classifier component of the MindMeld natural language processor.
 """
 import logging
+import os
+import pickle
+import threading
 
-from sklearn.externals import joblib
+import joblib
 
 from ..constants import DEFAULT_TRAIN_SET_REGEX
 from ..core import Query
@@ -26,6 +29,19 @@ from .classifier import Classifier, ClassifierConfig, ClassifierLoadError
 
 logger = logging.getLogger(__name__)
 
+try:
+    import lz4  # noqa: F401 pylint: disable=unused-import
+
+    MODEL_COMPRESSION = ("lz4", 3)
+except ImportError:
+    MODEL_COMPRESSION = 3
+
+try:
+    # Role models were dumped with the copy of joblib vendored by scikit-learn before 0.20
+    from sklearn.externals import joblib as sklearn_joblib
+except ImportError:
+    sklearn_joblib = None
+
 
 class RoleClassifier(Classifier):
     """A role classifier is used to determine the target role for entities in a given query. It is
@@ -54,7 +70,20 @@ class RoleClassifier(Classifier):
         self.domain = domain
         self.intent = intent
         self.entity_type = entity_type
+        self._pending_model_path = None
+        self._load_lock = threading.Lock()
         self.roles = set()
+        self._resources_generation = None
+
+    @property
+    def roles(self):
+        """set: A set containing the roles which can be classified"""
+        self._load_pending_model()
+        return self._roles
+
+    @roles.setter
+    def roles(self, roles):
+        self._roles = roles
 
     # pylint: disable=arguments-differ
     def _get_model_config(self, **kwargs):
@@ -90,6 +119,9 @@ class RoleClassifier(Classifier):
             self.entity_type,
         )
 
+        # A newly fit model replaces any model which hasn't been loaded yet
+        self._pending_model_path = None
+
         # create model with given params
         model_config = self._get_model_config(**kwargs)
         model = create_model(model_config)
@@ -107,17 +139,16 @@ class RoleClassifier(Classifier):
             return
 
         # Load labeled data
-        examples, labels = self._get_queries_and_labels(queries, label_set=label_set)
+        examples, labels, roles = self._get_examples_labels_and_roles(
+            queries, label_set=label_set
+        )
 
         if examples:
-            # Build roles set
-            self.roles = set()
-            for label in labels:
-                self.roles.add(label)
-
+            self.roles = roles
             model.initialize_resources(self._resource_loader, queries, labels)
             model.fit(examples, labels)
             self._model = model
+            self._resources_generation = None
             self.config = ClassifierConfig.from_model_config(self._model.config)
 
         self.hash = new_hash
@@ -126,7 +157,18 @@ class RoleClassifier(Classifier):
         self.dirty = True
 
     def _data_dump_payload(self):
-        return {"model": self._model, "roles": self.roles}
+        return {"model": self._model, "roles": self.roles, "hash": self.hash}
+
+    def _create_and_dump_payload(self, path):
+        # Write to a temporary file first so that a crash never leaves a partial model behind
+        tmp_path = path + ".tmp"
+        joblib.dump(
+            self._data_dump_payload(),
+            tmp_path,
+            compress=MODEL_COMPRESSION,
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+        os.replace(tmp_path, path)
 
     def dump(self, model_path, incremental_model_path=None):
         """Persists the trained role classification model to disk.
@@ -142,14 +184,43 @@ class RoleClassifier(Classifier):
             self.intent,
             self.entity_type,
         )
+        self._load_pending_model()
         super().dump(model_path, incremental_model_path)
 
     def load(self, model_path):
-        """Loads the trained role classification model from disk.
+        """Loads the trained role classification model from disk. Apps have a role classifier
+        for every entity type of every intent and most of them may never be used, so the model
+        is only read from disk when it is first needed.
 
         Args:
             model_path (str): The location on disk where the model is stored
         """
+        if not os.path.isfile(model_path):
+            logger.error(
+                "Unable to load %s. Pickle file cannot be read from %r",
+                self.__class__.__name__,
+                model_path,
+            )
+            return
+        self._pending_model_path = model_path
+        self.ready = True
+        self.dirty = False
+
+    def _load_pending_model(self):
+        """Loads the model recorded by load(), if it hasn't been loaded yet. When several threads
+        need the model at once, one of them loads it while the others wait.
+        """
+        if self._pending_model_path is None:
+            return
+        with self._load_lock:
+            if self._pending_model_path is None:
+                return
+            self._load_model(self._pending_model_path)
+            # Only clear the path once the model is loaded, since other threads skip the lock
+            # when it is None
+            self._pending_model_path = None
+
+    def _load_model(self, model_path):
         logger.info(
             "Loading role classifier: domain=%r, intent=%r, entity_type=%r",
             self.domain,
@@ -157,18 +228,17 @@ class RoleClassifier(Classifier):
             self.entity_type,
         )
         try:
-            rc_data = joblib.load(model_path)
+            rc_data = self._read_payload(model_path)
             self._model = rc_data["model"]
             self.roles = rc_data["roles"]
-        except (OSError, IOError):
-            logger.error(
-                "Unable to load %s. Pickle file cannot be read from %r",
-                self.__class__.__name__,
-                model_path,
-            )
-            return
-            # msg = 'Unable to load {}. Pickle file cannot be read from {!r}'
-            # raise ClassifierLoadError(msg.format(self.__class__.__name__, model_path))
+            model_hash = rc_data.get("hash")
+        except (OSError, IOError) as error:
+            # The model is read on first use, so fail loudly rather than predicting no roles
+            self.ready = False
+            msg = "Unable to load {}. Pickle file cannot be read from {!r}"
+            raise ClassifierLoadError(
+                msg.format(self.__class__.__name__, model_path)
+            ) from error
         if self._model is not None:
             if not hasattr(self._model, "mindmeld_version"):
                 msg = (
@@ -182,15 +252,43 @@ class RoleClassifier(Classifier):
                 # Loaded model config is incompatible with app config.
                 self._model.config.resolve_config(self._get_model_config())
 
-            gazetteers = self._resource_loader.get_gazetteers()
-            tokenizer = self._resource_loader.get_tokenizer()
-            self._model.register_resources(gazetteers=gazetteers, tokenizer=tokenizer)
+            self._resources_generation = None
+            self._register_resources()
             self.config = ClassifierConfig.from_model_config(self._model.config)
 
-        self.hash = self._load_hash(model_path)
+        # Models dumped by older versions only store their hash in the separate hash file
+        self.hash = self._load_hash(model_path) if model_hash is None else model_hash
 
-        self.ready = True
-        self.dirty = False
+    @staticmethod
+    def _read_payload(model_path):
+        """Reads a dumped model. Models dumped through the joblib vendored by scikit-learn can't
+        be read by the standalone joblib, so they are read with the vendored one instead.
+        """
+        loaders = [joblib] if sklearn_joblib is None else [joblib, sklearn_joblib]
+        for loader in loaders:
+            try:
+                return loader.load(model_path)
+            except (OSError, IOError):
+                raise
+            except Exception as error:  # pylint: disable=broad-except
+                load_error = error
+        raise ClassifierLoadError(
+            "Your trained models are incompatible with this version of MindMeld. "
+            "Please run a clean build to retrain models"
+        ) from load_error
+
+    def _register_resources(self):
+        """Registers the gazetteers and tokenizer with the model. They are only registered again
+        once the resource loader has built or loaded a gazetteer, since building the gazetteers
+        dictionary requires checking every entity's files.
+        """
+        if self._resource_loader.gazetteers_generation == self._resources_generation:
+            return
+        gazetteers = self._resource_loader.get_gazetteers()
+        tokenizer = self._resource_loader.get_tokenizer()
+        self._model.register_resources(gazetteers=gazetteers, tokenizer=tokenizer)
+        # Read the counter after get_gazetteers(), which may have reloaded some gazetteers
+        self._resources_generation = self._resource_loader.gazetteers_generation
 
     def predict(
         self, query, entities, entity_index
@@ -205,17 +303,39 @@ class RoleClassifier(Classifier):
         Returns:
             str: The predicted role for the provided entity
         """
+        roles = self.predict_batch([(query, entities, entity_index)])
+        return roles[0] if roles else None
+
+    def predict_batch(self, items):
+        """Predicts roles for a batch of entities using the trained role classification model.
+        Extracting the features of all the entities at once is faster than calling predict() for
+        each of them.
+
+        Args:
+            items (list): A list of tuples of the form (query, entities, entity_index), where \
+                query is the input query, entities are the entities in the query and \
+                entity_index is the index of the entity whose role should be classified
+
+        Returns:
+            list: The predicted role for each of the provided entities
+        """
+        self._load_pending_model()
         if not self._model:
             logger.error("You must fit or load the model before running predict")
             return
         if len(self.roles) == 1:
-            return list(self.roles)[0]
-        if not isinstance(query, Query):
-            query = self._resource_loader.query_factory.create_query(query)
-        gazetteers = self._resource_loader.get_gazetteers()
-        tokenizer = self._resource_loader.get_tokenizer()
-        self._model.register_resources(gazetteers=gazetteers, tokenizer=tokenizer)
-        return self._model.predict([(query, entities, entity_index)])[0]
+            return [list(self.roles)[0]] * len(items)
+        create_query = self._resource_loader.query_factory.create_query
+        items = [
+            (
+                query if isinstance(query, Query) else create_query(query),
+                entities,
+                entity_index,
+            )
+            for query, entities, entity_index in items
+        ]
+        self._register_resources()
+        return list(self._model.predict(items))
 
     def predict_proba(
         self, query, entities, entity_index
@@ -231,6 +351,7 @@ class RoleClassifier(Classifier):
         Returns:
             list: a list of tuples of the form (str, float) grouping roles and their probabilities
         """
+        self._load_pending_model()
         if not self._model:
             logger.error("You must fit or load the model before running predict")
             return
@@ -238,9 +359,7 @@ class RoleClassifier(Classifier):
             return [(list(self.roles)[0], 1.0)]
         if not isinstance(query, Query):
             query = self._resource_loader.query_factory.create_query(query)
-        gazetteers = self._resource_loader.get_gazetteers()
-        tokenizer = self._resource_loader.get_tokenizer()
-        self._model.register_resources(gazetteers=gazetteers, tokenizer=tokenizer)
+        self._register_resources()
 
         predict_proba_result = self._model.predict_proba(
             [(query, entities, entity_index)]
@@ -248,6 +367,20 @@ class RoleClassifier(Classifier):
         class_proba_tuples = list(predict_proba_result[0][1].items())
         return sorted(class_proba_tuples, key=lambda x: x[1], reverse=True)
 
+    def evaluate(self, queries=None, label_set=None):
+        """Evaluates the trained role classification model on the given test data
+
+        Args:
+            queries (list of ProcessedQuery): The labeled queries to use as test data. If none
+                are provided, the test label set will be used.
+            label_set (str): The label set to use for evaluation.
+
+        Returns:
+            ModelEvaluation: A ModelEvaluation object that contains evaluation results
+        """
+        self._load_pending_model()
+        return super().evaluate(queries=queries, label_set=label_set)
+
     # pylint: disable=arguments-differ
     def view_extracted_features(self, query, entities, entity_index):
         """
@@ -261,14 +394,13 @@ class RoleClassifier(Classifier):
         Returns:
             dict: The extracted features from the given input
         """
+        self._load_pending_model()
         if not self._model:
             logger.error("You must fit or load the model to initialize resources")
             return
         if not isinstance(query, Query):
             query = self._resource_loader.query_factory.create_query(query)
-        gazetteers = self._resource_loader.get_gazetteers()
-        tokenizer = self._resource_loader.get_tokenizer()
-        self._model.register_resources(gazetteers=gazetteers, tokenizer=tokenizer)
+        self._register_resources()
         return self._model._extract_features((query, entities, entity_index))
 
     def _get_query_tree(
@@ -298,6 +430,23 @@ class RoleClassifier(Classifier):
     def _get_queries_and_labels(self, queries=None, label_set=DEFAULT_TRAIN_SET_REGEX):
         """Returns a set of queries and their labels based on the label set
 
+        Args:
+            queries (list, optional): A list of ProcessedQuery objects, to
+                train on. If not specified, a label set will be loaded.
+            label_set (list, optional): A label set to load. If not specified,
+                the default training set will be loaded.
+        """
+        examples, labels, _ = self._get_examples_labels_and_roles(
+            queries, label_set=label_set
+        )
+        return examples, labels
+
+    def _get_examples_labels_and_roles(
+        self, queries=None, label_set=DEFAULT_TRAIN_SET_REGEX
+    ):
+        """Returns the examples and labels based on the label set, along with
+        the set of distinct roles among the labels
+
         Args:
             queries (list, optional): A list of ProcessedQuery objects, to
                 train on. If not specified, a label set will be loaded.
@@ -308,18 +457,21 @@ class RoleClassifier(Classifier):
         queries = self._resource_loader.flatten_query_tree(query_tree)
 
         # build list of examples -- entities of this role classifier's type
+        entity_type = self.entity_type
         examples = []
         labels = []
         for query in queries:
-            for idx, entity in enumerate(query.entities):
-                if entity.entity.type == self.entity_type and entity.entity.role:
-                    examples.append((query.query, query.entities, idx))
-                    labels.append(entity.entity.role)
+            query_entities = query.entities
+            for idx, query_entity in enumerate(query_entities):
+                entity = query_entity.entity
+                if entity.type == entity_type and entity.role:
+                    examples.append((query.query, query_entities, idx))
+                    labels.append(entity.role)
 
         unique_labels = set(labels)
         if len(unique_labels) == 0:
             # No roles
-            return (), ()
+            return (), (), set()
         if None in unique_labels:
             bad_examples = [e for i, e in enumerate(examples) if labels[i] is None]
             for example in bad_examples:
@@ -328,7 +480,7 @@ class RoleClassifier(Classifier):
                 )
             raise ValueError("One or more invalid entity annotations, expecting role")
 
-        return examples, labels
+        return examples, labels, unique_labels
 
     def _get_queries_and_labels_hash(
         self, queries=None, label_set=DEFAULT_TRAIN_SET_REGEX
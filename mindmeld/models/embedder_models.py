@@ -14,10 +14,17 @@
 """
 This module contains the embedder model class.
 """
+
 from abc import ABC, abstractmethod
-import pickle
+import atexit
+from collections import OrderedDict
+import glob
 import logging
 import os
+import tempfile
+import uuid
+
+import msgpack
 import numpy as np
 
 from .. import path
@@ -25,17 +32,378 @@ from .helpers import register_embedder
 from .taggers.embeddings import WordSequenceEmbedding
 from ..tokenizer import Tokenizer
 
-
 logger = logging.getLogger(__name__)
 
 try:
+    import torch
     from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Pooling
+    from transformers import AutoTokenizer
 
     register_bert = True
 except ImportError:
     logger.info("Must install the extra [bert] to use the built in embbedder.")
     register_bert = False
 
+try:
+    import onnxruntime
+
+    onnx_available = True
+except ImportError:
+    onnx_available = False
+
+
+class EmbeddingCache:
+    """A bounded cache of text embeddings backed by files on disk.
+
+    The embeddings are stored as the rows of a memory-mapped matrix, and a small msgpack index
+    maps each text to its row. Loading the cache only reads the index; the rows are paged in
+    from disk as they are accessed. Once the cache holds its maximum number of entries, the
+    least recently used entry is evicted.
+
+    The files are only modified by dump(). The embeddings added since the previous dump are held
+    in memory, then appended to the matrix along with an index record mapping their texts to the
+    new rows, so the rows referenced by the index on disk are never modified. Once more than half
+    of the rows of the matrix belong to evicted or replaced entries, the cache is written to a
+    new matrix and index instead.
+    """
+
+    WRITE_BATCH_SIZE = 1024
+    DEFAULT_MAX_SIZE = 100000
+
+    def __init__(self, cache_path, dtype=np.float32, max_size=DEFAULT_MAX_SIZE):
+        """Initializes the cache, loading the index from disk if it exists.
+
+        Args:
+            cache_path (str): The path to the index file. The matrix is stored alongside it.
+            dtype (numpy.dtype, optional): The data type used to store the embeddings.
+            max_size (int, optional): The maximum number of embeddings to keep.
+        """
+        if max_size < 1:
+            raise ValueError(
+                "The maximum size of an embedding cache must be at least 1, got {!r}.".format(
+                    max_size
+                )
+            )
+        self.cache_path = cache_path
+        self.dim = None
+        self.dtype = np.dtype(dtype)
+        self.max_size = max_size
+        # Maps each text to its row in the matrix, or to None if it hasn't been dumped yet
+        self._index = OrderedDict()
+        # The embeddings added since the last dump
+        self._pending = OrderedDict()
+        self._matrix = None
+        self._matrix_name = None
+
+        if os.path.exists(self.cache_path):
+            self._load_index()
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, text):
+        return text in self._index
+
+    def __setitem__(self, text, vector):
+        vector = np.array(vector, dtype=self.dtype)
+        if self.dim is None:
+            self.dim = vector.shape[-1]
+
+        if text in self._index:
+            self._index.move_to_end(text)
+        else:
+            if len(self._index) >= self.max_size:
+                self._pending.pop(self._index.popitem(last=False)[0], None)
+            self._index[text] = None
+        self._pending[text] = vector
+
+    def get(self, text, default=None):
+        """Gets the embedding for a text, marking it as recently used.
+
+        Args:
+            text (str): The text to look up.
+            default (optional): The value to return if the text is not cached.
+
+        Returns:
+            (numpy.ndarray): A copy of the cached embedding, or the default.
+        """
+        if text not in self._index:
+            return default
+        self._index.move_to_end(text)
+        return self._get_vectors([text])[0]
+
+    def get_many(self, texts):
+        """Gets the embeddings for texts which are all in the cache, marking them as recently
+        used.
+
+        Args:
+            texts (list): The texts to look up.
+
+        Returns:
+            (numpy.ndarray): A 2D array with the embedding of each text as a row.
+        """
+        for text in texts:
+            self._index.move_to_end(text)
+        return self._get_vectors(texts)
+
+    def dump(self):
+        """Writes the embeddings added since the last dump to disk.
+
+        Other caches on the same path may have dumped since this one was loaded, so the index
+        is read again first. The new rows are appended after theirs, and the entries they added
+        are kept when the cache is rewritten.
+        """
+        if not self._pending and (
+            self._matrix is None or self._matrix.dtype == self.dtype
+        ):
+            return
+
+        # Appending to the matrix mapped by this cache only needs the header of the index
+        header, _ = self._read_index(header_only=True)
+        if (
+            header is not None
+            and header["matrix"] == self._matrix_name
+            and self._is_appendable(header)
+        ):
+            num_rows = self._count_rows(header)
+            if num_rows + len(self._pending) <= 2 * len(self._index):
+                self._append(header["matrix"], num_rows, list(self._pending))
+                return
+
+        header, disk_index = self._read_index()
+        if header is None or header["dim"] != self.dim:
+            self._rewrite()
+            return
+        if self._is_appendable(header):
+            moved_rows = {}
+            if header["matrix"] == self._matrix_name:
+                texts = list(self._pending)
+            else:
+                # Another cache has rewritten the matrix, so the entries it also holds are
+                # mapped to its rows and the others are appended to it
+                texts = []
+                for text in self._index:
+                    if text not in self._pending and text in disk_index:
+                        moved_rows[text] = disk_index[text]
+                    else:
+                        texts.append(text)
+            num_rows = self._count_rows(header)
+            num_used = min(self.max_size, len(disk_index.keys() | self._index.keys()))
+            if num_rows + len(texts) <= 2 * num_used:
+                self._append(header["matrix"], num_rows, texts, moved_rows)
+                return
+        self._rewrite(header, disk_index)
+
+    def clear(self):
+        """Empties the cache and deletes its files."""
+        self._matrix = None
+        self._matrix_name = None
+        self._index = OrderedDict()
+        self._pending = OrderedDict()
+        self.dim = None
+        if os.path.exists(self.cache_path):
+            os.remove(self.cache_path)
+        self._remove_matrices()
+
+    def _load_index(self):
+        header, index = self._read_index()
+        if header is None:
+            logger.info("Discarding embedder cache with an outdated format.")
+        elif index:
+            self.dim = header["dim"]
+            self._matrix_name = header["matrix"]
+            dtype = np.dtype(header["dtype"])
+            if dtype != self.dtype:
+                # The embeddings are converted as they are read, and the matrix is rewritten
+                # with the new data type on the next dump
+                logger.info(
+                    "Converting the cached embeddings from %s to %s.", dtype, self.dtype
+                )
+            self._map_matrix(dtype)
+            self._index = OrderedDict(
+                (text, row) for text, row in index.items() if row < len(self._matrix)
+            )
+            while len(self._index) > self.max_size:
+                self._index.popitem(last=False)
+
+    def _read_index(self, header_only=False):
+        """Reads the index file.
+
+        Args:
+            header_only (bool, optional): Whether to only read the header of the index.
+
+        Returns:
+            tuple: The header of the index, or None if there is no valid index, and an \
+                OrderedDict mapping each text to its row, from the least to the most recently \
+                written.
+        """
+        header = None
+        index = OrderedDict()
+        try:
+            with open(self.cache_path, "rb") as fp:
+                records = msgpack.Unpacker(fp, raw=False)
+                header = next(records, None)
+                # Later records take precedence over earlier ones
+                for record in () if header_only else records:
+                    for text, row in record.items():
+                        index.pop(text, None)
+                        index[text] = row
+        except (
+            OSError,
+            ValueError,
+            TypeError,
+            AttributeError,
+            msgpack.UnpackException,
+        ):
+            header = None
+
+        if (
+            not isinstance(header, dict)
+            or not {"dim", "dtype", "matrix"}.issubset(header)
+            or not os.path.exists(self._get_matrix_path(header["matrix"]))
+        ):
+            return None, OrderedDict()
+        return header, index
+
+    def _get_vectors(self, texts):
+        vectors = np.empty((len(texts), self.dim or 0), dtype=self.dtype)
+        stored_indices = []
+        stored_rows = []
+        for i, text in enumerate(texts):
+            vector = self._pending.get(text)
+            if vector is None:
+                stored_indices.append(i)
+                stored_rows.append(self._index[text])
+            else:
+                vectors[i] = vector
+        if stored_rows:
+            vectors[stored_indices] = self._matrix[stored_rows]
+        return vectors
+
+    def _write_vectors(self, fp, texts):
+        for start in range(0, len(texts), self.WRITE_BATCH_SIZE):
+            fp.write(
+                self._get_vectors(
+                    texts[start : start + self.WRITE_BATCH_SIZE]
+                ).tobytes()
+            )
+
+    def _append(self, matrix_name, start_row, texts, moved_rows=None):
+        """Appends the embeddings of texts to a matrix, then logs their rows in the index.
+
+        Args:
+            matrix_name (str): The file name of the matrix.
+            start_row (int): The number of complete rows in the matrix.
+            texts (list): The texts whose embeddings to append.
+            moved_rows (dict, optional): The rows in the matrix of entries which are already \
+                in it, when it was not the matrix mapped by this cache.
+        """
+        with open(self._get_matrix_path(matrix_name), "r+b") as fp:
+            # Drop any partial row left behind by an interrupted dump
+            fp.seek(start_row * self.dim * self.dtype.itemsize)
+            fp.truncate()
+            self._write_vectors(fp, texts)
+        rows = {text: start_row + i for i, text in enumerate(texts)}
+        with open(self.cache_path, "ab") as fp:
+            fp.write(msgpack.packb(rows, use_bin_type=True))
+
+        self._index.update(moved_rows or {})
+        self._index.update(rows)
+        self._pending = OrderedDict()
+        self._matrix_name = matrix_name
+        self._map_matrix()
+
+    def _rewrite(self, header=None, disk_index=None):
+        """Writes the whole cache to a new matrix and index, then deletes the old matrices.
+
+        Args:
+            header (dict, optional): The header of the index on disk.
+            disk_index (dict, optional): The index on disk. The entries which other caches have
+                added to it are kept, up to the maximum size of the cache, as entries less
+                recently used than the ones of this cache.
+        """
+        texts = list(self._index)
+        disk_texts = []
+        if disk_index:
+            disk_matrix = self._open_matrix(
+                header["matrix"], np.dtype(header["dtype"]), self._count_rows(header)
+            )
+            num_disk_rows = 0 if disk_matrix is None else len(disk_matrix)
+            disk_texts = [
+                text
+                for text, row in disk_index.items()
+                if text not in self._index and row < num_disk_rows
+            ]
+            disk_texts = disk_texts[
+                max(0, len(disk_texts) + len(texts) - self.max_size) :
+            ]
+
+        stem = os.path.basename(os.path.splitext(self.cache_path)[0])
+        matrix_name = "{}.{}.mmap".format(stem, uuid.uuid4().hex)
+        with open(self._get_matrix_path(matrix_name), "wb") as fp:
+            for start in range(0, len(disk_texts), self.WRITE_BATCH_SIZE):
+                rows = [
+                    disk_index[text]
+                    for text in disk_texts[start : start + self.WRITE_BATCH_SIZE]
+                ]
+                fp.write(disk_matrix[rows].astype(self.dtype).tobytes())
+            self._write_vectors(fp, texts)
+        rows = {text: row for row, text in enumerate(disk_texts + texts)}
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, "wb") as fp:
+            packer = msgpack.Packer(use_bin_type=True)
+            fp.write(
+                packer.pack(
+                    {"dim": self.dim, "dtype": self.dtype.str, "matrix": matrix_name}
+                )
+            )
+            fp.write(packer.pack(rows))
+        os.replace(tmp_path, self.cache_path)
+        self._remove_matrices(keep=matrix_name)
+
+        self._index = OrderedDict(rows)
+        self._pending = OrderedDict()
+        self._matrix_name = matrix_name
+        self._map_matrix()
+
+    def _is_appendable(self, header):
+        return header["dim"] == self.dim and np.dtype(header["dtype"]) == self.dtype
+
+    def _count_rows(self, header):
+        row_size = header["dim"] * np.dtype(header["dtype"]).itemsize
+        return os.path.getsize(self._get_matrix_path(header["matrix"])) // row_size
+
+    def _get_matrix_path(self, matrix_name):
+        return os.path.join(os.path.dirname(self.cache_path), matrix_name)
+
+    def _remove_matrices(self, keep=None):
+        stem = os.path.splitext(self.cache_path)[0]
+        for matrix_path in glob.glob(glob.escape(stem) + ".*.mmap"):
+            if os.path.basename(matrix_path) == keep:
+                continue
+            try:
+                os.remove(matrix_path)
+            except OSError:
+                # The file may still be open elsewhere on some platforms
+                pass
+
+    def _map_matrix(self, dtype=None):
+        dtype = self.dtype if dtype is None else dtype
+        matrix_path = self._get_matrix_path(self._matrix_name)
+        num_rows = os.path.getsize(matrix_path) // (self.dim * dtype.itemsize)
+        self._matrix = self._open_matrix(self._matrix_name, dtype, num_rows)
+
+    def _open_matrix(self, matrix_name, dtype, num_rows):
+        if not num_rows:
+            return None
+        return np.memmap(
+            self._get_matrix_path(matrix_name),
+            dtype=dtype,
+            mode="r",
+            shape=(num_rows, self.dim),
+        )
+
 
 class Embedder(ABC):
     """
@@ -44,6 +412,7 @@ class Embedder(ABC):
 
     def __init__(self, app_path, **kwargs):
         """Initializes an embedder."""
+        self.app_path = app_path
         self.model_name = kwargs.get("model_name", "default")
         self.cache_path = path.get_embedder_cache_file_path(
             app_path, kwargs.get("embedder_type", "default"), self.model_name
@@ -53,12 +422,12 @@ class Embedder(ABC):
         if not os.path.isdir(folder):
             os.makedirs(folder)
 
-        if not os.path.exists(self.cache_path) or os.path.getsize(self.cache_path) == 0:
-            self.cache = {}
-        else:
-            with open(self.cache_path, "rb") as fp:
-                self.cache = pickle.load(fp)
-
+        self.cache = EmbeddingCache(
+            self.cache_path,
+            dtype=np.float16 if kwargs.get("fp16") else np.float32,
+            max_size=kwargs.get("max_cache_size", EmbeddingCache.DEFAULT_MAX_SIZE),
+        )
+        self.normalize_cache_keys = kwargs.get("normalize_cache_keys", False)
         self.model = self.load(**kwargs)
 
     @abstractmethod
@@ -77,14 +446,14 @@ class Embedder(ABC):
             text_list (list): A list of text strings for which to generate the embeddings.
 
         Returns:
-            (list): A list of numpy arrays of the embeddings.
+            (numpy.ndarray): A 2D array with the embedding of each text as a row. A list of \
+                numpy arrays is also accepted.
         """
         pass
 
     def clear_cache(self):
-        """Deletes the cache file."""
-        if os.path.exists(self.cache_path):
-            os.remove(self.cache_path)
+        """Deletes the cache files."""
+        self.cache.clear()
 
     def get_encodings(self, text_list):
         """Fetches the encoded values from the cache, or generates them.
@@ -92,22 +461,64 @@ class Embedder(ABC):
             text_list (list): A list of text strings for which to get the embeddings.
 
         Returns:
-            (list): A list of numpy arrays with the embeddings.
+            (numpy.ndarray): A 2D array with the embedding of each text as a row.
         """
-        encoded = [self.cache.get(text, None) for text in text_list]
-        cache_miss_indices = [i for i, vec in enumerate(encoded) if vec is None]
-        text_to_encode = [text_list[i] for i in cache_miss_indices]
-        model_encoded_text = self.encode(text_to_encode)
-
-        for i, v in enumerate(cache_miss_indices):
-            encoded[v] = model_encoded_text[i]
-            self.cache[text_to_encode[i]] = model_encoded_text[i]
+        # Look up the cache and group the misses by cache key in a single pass, so that texts
+        # sharing a key are only encoded once
+        hit_indices = []
+        hit_keys = []
+        key_to_indices = {}
+        cache = self.cache
+        get_cache_key = self._get_cache_key
+        for i, text in enumerate(text_list):
+            key = get_cache_key(text)
+            if key in cache:
+                hit_indices.append(i)
+                hit_keys.append(key)
+            else:
+                key_to_indices.setdefault(key, []).append(i)
+
+        # The hits must be read before the misses are inserted, which may evict them
+        hit_vectors = cache.get_many(hit_keys) if hit_keys else None
+        model_encoded_text = None
+        if key_to_indices:
+            model_encoded_text = np.asarray(
+                self.encode(
+                    [text_list[indices[0]] for indices in key_to_indices.values()]
+                )
+            )
+
+        if hit_vectors is not None:
+            dim = hit_vectors.shape[1]
+        elif model_encoded_text is not None:
+            dim = model_encoded_text.shape[1]
+        else:
+            dim = cache.dim or 0
+        encoded = np.empty((len(text_list), dim), dtype=cache.dtype)
+        if hit_vectors is not None:
+            encoded[hit_indices] = hit_vectors
+        if model_encoded_text is not None:
+            miss_indices = []
+            miss_rows = []
+            for row, (key, indices) in enumerate(key_to_indices.items()):
+                cache[key] = model_encoded_text[row]
+                miss_indices.extend(indices)
+                miss_rows.extend([row] * len(indices))
+            encoded[miss_indices] = model_encoded_text[miss_rows]
         return encoded
 
+    def _get_cache_key(self, text):
+        """Gets the key under which the embedding of a text is cached. When the
+        normalize_cache_keys setting is enabled, texts which only differ in case or whitespace
+        share a cache entry.
+        """
+        if self.normalize_cache_keys:
+            return " ".join(text.casefold().split())
+        return text
+
     def dump(self):
         """Dumps the cache to disk."""
-        with open(self.cache_path, "wb") as fp:
-            pickle.dump(self.cache, fp)
+        self.cache.dump()
 
 
 class BertEmbedder(Embedder):
@@ -116,17 +527,211 @@ class BertEmbedder(Embedder):
     """
 
     DEFAULT_BERT = "bert-base-nli-mean-tokens"
+    DEFAULT_BATCH_SIZE = 64
+    DEFAULT_NUM_THREADS = 8
+    DEFAULT_NUM_PROCESSES = 4
+    MIN_MULTIPROCESS_BATCH = 1000
 
     def load(self, **kwargs):
+        num_threads = os.environ.get(
+            "MM_TORCH_THREADS", min(self.DEFAULT_NUM_THREADS, os.cpu_count() or 1)
+        )
+        torch.set_num_threads(int(num_threads))
         if self.model_name == "default":
             bert_model_name = self.DEFAULT_BERT
             logger.info("No bert model specifications passed, using default.")
         else:
             bert_model_name = self.model_name
-        return SentenceTransformer(bert_model_name)
+        self.batch_size = kwargs.get("batch_size", self.DEFAULT_BATCH_SIZE)
+        self.fp16 = kwargs.get("fp16", False)
+        model = SentenceTransformer(bert_model_name, device=kwargs.get("device"))
+        self._use_fast_tokenizer(model)
+        self.onnx_session = None
+        if kwargs.get("backend") == "onnx":
+            self.onnx_session = self._load_onnx_session(
+                model, kwargs.get("embedder_type", "default")
+            )
+        self.pool = None
+        if kwargs.get("multiprocess") and not self.onnx_session:
+            self.pool = self._start_pool(model)
+        if self.fp16:
+            if model.device.type == "cuda":
+                model.half()
+            else:
+                logger.warning(
+                    "Half precision inference requires a GPU, running the model in full precision."
+                )
+        return model
 
     def encode(self, text_list):
-        return self.model.encode(text_list)
+        if not text_list:
+            return []
+        # Encode in order of increasing length so that each batch is padded to a similar length,
+        # then restore the caller's order.
+        order = np.argsort([len(text.split()) for text in text_list], kind="stable")
+        sorted_text_list = [text_list[i] for i in order]
+        if self.onnx_session:
+            encoded = self._encode_onnx(sorted_text_list)
+        elif self.pool and len(text_list) >= self.MIN_MULTIPROCESS_BATCH:
+            encoded = self.model.encode_multi_process(
+                sorted_text_list, self.pool, batch_size=self.batch_size
+            )
+        else:
+            encoded = np.asarray(
+                self.model.encode(
+                    sorted_text_list,
+                    batch_size=self.batch_size,
+                    show_progress_bar=False,
+                    convert_to_numpy=True,
+                )
+            )
+        output = np.empty_like(encoded, dtype=np.float16 if self.fp16 else None)
+        output[order] = encoded
+        return output
+
+    def _start_pool(self, model):
+        """Starts a pool of worker processes to encode large batches on CPU.
+
+        Returns:
+            dict: The pool, or None if it cannot be used with the model.
+        """
+        if model.device.type != "cpu":
+            logger.info("Multiprocess encoding is only used on CPU.")
+            return None
+        if not hasattr(model, "start_multi_process_pool"):
+            logger.warning(
+                "Multiprocess encoding requires a newer version of sentence-transformers."
+            )
+            return None
+        num_processes = min(self.DEFAULT_NUM_PROCESSES, os.cpu_count() or 1)
+        pool = model.start_multi_process_pool(target_devices=["cpu"] * num_processes)
+        atexit.register(model.stop_multi_process_pool, pool)
+        return pool
+
+    @staticmethod
+    def _use_fast_tokenizer(model):
+        """Replaces the tokenizer of the model with the equivalent fast (Rust) tokenizer."""
+        transformer = model._first_module()
+        tokenizer = getattr(transformer, "tokenizer", None)
+        if tokenizer is None or getattr(tokenizer, "is_fast", False):
+            return
+
+        try:
+            with tempfile.TemporaryDirectory() as tokenizer_path:
+                tokenizer.save_pretrained(tokenizer_path)
+                fast_tokenizer = AutoTokenizer.from_pretrained(
+                    tokenizer_path, config=transformer.bert.config, use_fast=True
+                )
+        except Exception:  # pylint: disable=broad-except
+            fast_tokenizer = None
+
+        # Only keep the fast tokenizer if the model builds exactly the same features with it,
+        # going through the same calls as the torch and onnx backends
+        features = fast_features = None
+        if getattr(fast_tokenizer, "is_fast", False):
+            features = BertEmbedder._get_sample_features(transformer)
+            transformer.tokenizer = fast_tokenizer
+            try:
+                fast_features = BertEmbedder._get_sample_features(transformer)
+            except Exception:  # pylint: disable=broad-except
+                pass
+        if fast_features is None or fast_features != features:
+            transformer.tokenizer = tokenizer
+            logger.info(
+                "No fast tokenizer available, using %s.", type(tokenizer).__name__
+            )
+
+    @staticmethod
+    def _get_sample_features(transformer):
+        sample = "MindMeld tokenizer check: 12.5 déjà-vu!"
+        tokens = transformer.tokenize(sample)
+        # Pad the sample to also compare the padding
+        features = transformer.get_sentence_features(tokens, len(tokens) + 2)
+        return {key: features[key].tolist() for key in ("input_ids", "attention_mask")}
+
+    def _load_onnx_session(self, model, embedder_type):
+        """Exports the transformer of the model to ONNX, if it hasn't been already, and creates
+        an ONNX Runtime session for it.
+
+        Only models made of a BERT transformer followed by mean pooling are supported. For any
+        other model None is returned, and the model is run with torch.
+        """
+        if not onnx_available:
+            logger.warning(
+                "Must install onnxruntime to use the onnx backend, using torch instead."
+            )
+            return None
+        transformer, pooling = model._first_module(), model._last_module()
+        if (
+            len(model) != 2
+            or not hasattr(transformer, "bert")
+            or not isinstance(pooling, Pooling)
+            or not pooling.pooling_mode_mean_tokens
+            or pooling.pooling_output_dimension != pooling.word_embedding_dimension
+        ):
+            logger.warning(
+                "The onnx backend only supports BERT models with mean pooling, "
+                "using torch instead."
+            )
+            return None
+
+        onnx_path = path.get_embedder_onnx_model_path(
+            self.app_path, embedder_type, self.model_name
+        )
+        if not os.path.exists(onnx_path):
+            logger.info("Exporting %r to ONNX.", self.model_name)
+            features = transformer.get_sentence_features(
+                transformer.tokenize("onnx export"), 2
+            )
+            dynamic_axes = {0: "batch", 1: "sequence"}
+            with torch.no_grad():
+                torch.onnx.export(
+                    transformer.bert,
+                    (
+                        features["input_ids"].to(model.device),
+                        features["attention_mask"].to(model.device),
+                    ),
+                    onnx_path,
+                    input_names=["input_ids", "attention_mask"],
+                    output_names=["token_embeddings"],
+                    dynamic_axes={
+                        "input_ids": dynamic_axes,
+                        "attention_mask": dynamic_axes,
+                        "token_embeddings": dynamic_axes,
+                    },
+                    opset_version=11,
+                )
+        return onnxruntime.InferenceSession(
+            onnx_path, providers=["CPUExecutionProvider"]
+        )
+
+    def _encode_onnx(self, text_list):
+        transformer = self.model._first_module()
+        encoded = []
+        for start in range(0, len(text_list), self.batch_size):
+            batch_tokens = [
+                transformer.tokenize(text)
+                for text in text_list[start : start + self.batch_size]
+            ]
+            longest_seq = max(len(tokens) for tokens in batch_tokens)
+            features = [
+                transformer.get_sentence_features(tokens, longest_seq)
+                for tokens in batch_tokens
+            ]
+            input_ids = np.concatenate([f["input_ids"].numpy() for f in features])
+            attention_mask = np.concatenate(
+                [f["attention_mask"].numpy() for f in features]
+            )
+            token_embeddings = self.onnx_session.run(
+                ["token_embeddings"],
+                {"input_ids": input_ids, "attention_mask": attention_mask},
+            )[0]
+
+            # Mean pooling over the tokens which are not padding
+            mask = attention_mask[..., np.newaxis].astype(token_embeddings.dtype)
+            summed = (token_embeddings * mask).sum(axis=1)
+            encoded.append(summed / np.maximum(mask.sum(axis=1), 1e-9))
+        return np.concatenate(encoded)
 
 
 class GloveEmbedder(Embedder):
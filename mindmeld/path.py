@@ -56,7 +56,10 @@ GEN_INDEXES_FOLDER = os.path.join(GEN_FOLDER, "indexes")
 GEN_INDEX_FOLDER = os.path.join(GEN_INDEXES_FOLDER, "{index}")
 RANKING_MODEL_PATH = os.path.join(GEN_INDEX_FOLDER, "ranking.pkl")
 GEN_EMBEDDER_MODEL_PATH = os.path.join(
-    GEN_INDEXES_FOLDER, "{embedder_type}_{model_name}_cache.pkl"
+    GEN_INDEXES_FOLDER, "{embedder_type}_{model_name}_cache.msgpack"
+)
+GEN_EMBEDDER_ONNX_MODEL_PATH = os.path.join(
+    GEN_INDEXES_FOLDER, "{embedder_type}_{model_name}.onnx"
 )
 
 # Domains sub tree for labeled queries
@@ -520,7 +523,7 @@ def get_ranking_file_path(app_path, index):
 
 @safe_path
 def get_embedder_cache_file_path(app_path, embedder_type, model_name):
-    """Gets the path to the model_cache.json file for a given embedder model.
+    """Gets the path to the cache index file for a given embedder model.
 
     Args:
         app_path (str): The path to the app data.
@@ -528,7 +531,7 @@ def get_embedder_cache_file_path(app_path, embedder_type, model_name):
         model_name (str): The name of the specific trained model.
 
     Returns:
-        (str) The path for the json cached of the embedded values.
+        (str) The path for the msgpack index of the cached embedded values.
     """
     return GEN_EMBEDDER_MODEL_PATH.format(
         app_path=app_path,
@@ -537,6 +540,25 @@ def get_embedder_cache_file_path(app_path, embedder_type, model_name):
     )
 
 
+@safe_path
+def get_embedder_onnx_model_path(app_path, embedder_type, model_name):
+    """Gets the path to the exported ONNX model for a given embedder model.
+
+    Args:
+        app_path (str): The path to the app data.
+        embedder_type (str): The name of the embedder type.
+        model_name (str): The name of the specific trained model.
+
+    Returns:
+        (str) The path for the exported ONNX model.
+    """
+    return GEN_EMBEDDER_ONNX_MODEL_PATH.format(
+        app_path=app_path,
+        embedder_type=embedder_type,
+        model_name=model_name,
+    )
+
+
 @safe_path
 def get_app_module_path(app_path):
     """Gets the path to the application file (app.py) for a given application if it exists.
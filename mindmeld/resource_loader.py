@@ -80,6 +80,7 @@ class ResourceLoader:
         #   }
         # }
         self._entity_files = {}
+        self._gazetteers_generation = 0
 
         # Example layout: {
         #   'domain': {
@@ -99,6 +100,11 @@ class ResourceLoader:
         self.query_cache = query_cache or QueryCache(app_path=self.app_path)
         self._hash_to_model_path = None
 
+    @property
+    def gazetteers_generation(self):
+        """int: A counter which is incremented every time a gazetteer is built or loaded."""
+        return self._gazetteers_generation
+
     @property
     def hash_to_model_path(self):
         """dict: A dictionary that maps hashes to the file path of the classifier."""
@@ -226,6 +232,7 @@ class ResourceLoader:
 
         self._entity_files[gaz_name]["gazetteer"]["data"] = gaz.to_dict()
         self._entity_files[gaz_name]["gazetteer"]["loaded"] = time.time()
+        self._gazetteers_generation += 1
 
     def load_gazetteer(self, gaz_name):
         """
@@ -239,6 +246,7 @@ class ResourceLoader:
         gaz.load(gaz_path)
         self._entity_files[gaz_name]["gazetteer"]["data"] = gaz.to_dict()
         self._entity_files[gaz_name]["gazetteer"]["loaded"] = time.time()
+        self._gazetteers_generation += 1
 
     def get_entity_map(self, entity_type, force_reload=False):
         """Creates a mapping file for a given entity.
@@ -34,6 +34,8 @@ requirements = [
     'python-crfsuite>=0.9.6,<1.0; python_version >= "3.7"',
     "sklearn-crfsuite>=0.3.6,<1.0",
     "immutables~=0.9",
+    "joblib>=0.12",
+    "msgpack>=0.6",
     "pyyaml>=5.1.1",
     "spacy>=2.3.0",
     "mypy>=0.782",
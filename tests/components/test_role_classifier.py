@@ -4,6 +4,8 @@ import shutil
 import pytest
 
 from mindmeld.components import NaturalLanguageProcessor
+from mindmeld.components.classifier import ClassifierLoadError
+from mindmeld.components.role_classifier import RoleClassifier
 from mindmeld.path import MODEL_CACHE_PATH, get_entity_model_paths, get_role_model_paths
 
 test_data_7 = [
@@ -35,6 +37,128 @@ def test_role_classifier(home_assistant_nlp, example, role_order_0, role_order_1
     assert [tup[0] for tup in probs] == role_order_1
 
 
+@pytest.mark.parametrize("example,role_order_0,role_order_1", test_data_7)
+def test_role_classifier_predict_batch(
+    home_assistant_nlp, example, role_order_0, role_order_1
+):
+    intent = home_assistant_nlp.domains[example[1]].intents[example[2]]
+    entity_recognizer = intent.entity_recognizer
+    role_classifier = intent.entities[example[3]].role_classifier
+
+    entities = entity_recognizer.predict(example[0])
+    roles = role_classifier.predict_batch(
+        [(example[0], entities, 0), (example[0], entities, 1)]
+    )
+    assert roles == [role_order_0[0], role_order_1[0]]
+    assert roles[0] == role_classifier.predict(example[0], entities, 0)
+
+
+def test_role_classifier_registers_reloaded_gazetteers(home_assistant_nlp, monkeypatch):
+    example = test_data_7[0][0]
+    intent = home_assistant_nlp.domains[example[1]].intents[example[2]]
+    role_classifier = intent.entities[example[3]].role_classifier
+    entities = intent.entity_recognizer.predict(example[0])
+    resource_loader = role_classifier._resource_loader
+
+    role_classifier.predict(example[0], entities, 0)
+    registered = role_classifier._model._resources["gazetteers"]
+
+    # The gazetteers are not checked again until one of them is reloaded
+    with monkeypatch.context() as patch:
+        patch.setattr(
+            resource_loader,
+            "get_gazetteers",
+            lambda: pytest.fail("The gazetteers should not be checked again"),
+        )
+        role_classifier.predict(example[0], entities, 0)
+    assert role_classifier._model._resources["gazetteers"] is registered
+
+    # Reload a gazetteer, as the resource loader does after its files change
+    gaz_name = sorted(registered)[0]
+    resource_loader.load_gazetteer(gaz_name)
+    role_classifier.predict(example[0], entities, 0)
+    gazetteers = role_classifier._model._resources["gazetteers"]
+    assert gazetteers[gaz_name] is not registered[gaz_name]
+    assert gazetteers[gaz_name] is resource_loader.get_gazetteer(gaz_name)
+
+
+def test_role_classifier_load_is_deferred(
+    home_assistant_nlp, home_assistant_app_path, tmpdir
+):
+    example = test_data_7[0][0]
+    intent = home_assistant_nlp.domains[example[1]].intents[example[2]]
+    fitted = intent.entities[example[3]].role_classifier
+    entities = intent.entity_recognizer.predict(example[0])
+    model_path, _ = get_role_model_paths(
+        home_assistant_app_path, example[1], example[2], example[3]
+    )
+
+    def load_role_classifier():
+        role_classifier = RoleClassifier(
+            fitted._resource_loader, example[1], example[2], example[3]
+        )
+        role_classifier.load(model_path)
+        assert role_classifier.ready
+        assert role_classifier._model is None
+        return role_classifier
+
+    assert load_role_classifier().roles == fitted.roles
+
+    role_classifier = load_role_classifier()
+    assert role_classifier.predict(example[0], entities, 0) == fitted.predict(
+        example[0], entities, 0
+    )
+
+    role_classifier = load_role_classifier()
+    dump_path = str(tmpdir.join("role.pkl"))
+    role_classifier.dump(dump_path)
+    assert role_classifier._model is not None
+    assert role_classifier.hash == fitted.hash
+    assert os.path.isfile(dump_path)
+
+
+def test_role_classifier_deferred_load_failure(home_assistant_nlp, tmpdir):
+    example = test_data_7[0][0]
+    intent = home_assistant_nlp.domains[example[1]].intents[example[2]]
+    fitted = intent.entities[example[3]].role_classifier
+    model_path = str(tmpdir.join("role.pkl"))
+    fitted.dump(model_path)
+
+    role_classifier = RoleClassifier(
+        fitted._resource_loader, example[1], example[2], example[3]
+    )
+    role_classifier.load(model_path)
+    os.remove(model_path)
+    with pytest.raises(ClassifierLoadError):
+        role_classifier.roles
+    assert not role_classifier.ready
+
+
+def test_role_classifier_load_legacy_model(home_assistant_nlp, tmpdir):
+    sklearn_joblib = pytest.importorskip("sklearn.externals.joblib")
+    example = test_data_7[0][0]
+    intent = home_assistant_nlp.domains[example[1]].intents[example[2]]
+    fitted = intent.entities[example[3]].role_classifier
+    entities = intent.entity_recognizer.predict(example[0])
+
+    # Models dumped by older versions went through the joblib vendored by scikit-learn, and
+    # only have their hash in a separate file
+    model_path = str(tmpdir.join("role.pkl"))
+    sklearn_joblib.dump({"model": fitted._model, "roles": fitted.roles}, model_path)
+    with open(model_path + ".hash", "w") as hash_file:
+        hash_file.write(fitted.hash)
+
+    role_classifier = RoleClassifier(
+        fitted._resource_loader, example[1], example[2], example[3]
+    )
+    role_classifier.load(model_path)
+    assert role_classifier.roles == fitted.roles
+    assert role_classifier.hash == fitted.hash
+    assert role_classifier.predict(example[0], entities, 0) == fitted.predict(
+        example[0], entities, 0
+    )
+
+
 test_data_8 = [
     (
         [
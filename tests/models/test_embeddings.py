@@ -1,9 +1,11 @@
 import os
 import pytest
+import numpy as np
 from numpy import ndarray
 
 from mindmeld.models.taggers.embeddings import GloVeEmbeddingsContainer
-from mindmeld.models.embedder_models import BertEmbedder, GloveEmbedder
+from mindmeld.models import embedder_models
+from mindmeld.models.embedder_models import BertEmbedder, Embedder, GloveEmbedder
 
 APP_NAME = "kwik_e_mart"
 APP_PATH = os.path.join(
@@ -47,3 +49,370 @@ def test_glove_embedder():
     encoded_vec = embedder.encode(["test string"])[0]
     assert len(encoded_vec) == 300
     assert type(encoded_vec) == ndarray
+
+
+class CountingEmbedder(Embedder):
+    """An embedder which records the texts it is asked to encode"""
+
+    def load(self, **kwargs):
+        self.encoded_texts = []
+
+    def encode(self, text_list):
+        self.encoded_texts.extend(text_list)
+        return [np.array([float(len(text)), 1.0]) for text in text_list]
+
+
+def test_get_encodings_encodes_duplicates_once(tmpdir):
+    embedder = CountingEmbedder(str(tmpdir), model_name="counting")
+    encoded = embedder.get_encodings(["hello", "hi", "hello", "hello"])
+
+    assert embedder.encoded_texts == ["hello", "hi"]
+    assert encoded.shape == (4, 2)
+    assert all(np.array_equal(encoded[0], encoded[i]) for i in (2, 3))
+
+    embedder.get_encodings(["hi", "hey"])
+    assert embedder.encoded_texts == ["hello", "hi", "hey"]
+
+
+def test_embedder_cache_dump_and_load(tmpdir):
+    embedder = CountingEmbedder(str(tmpdir), model_name="counting")
+    texts = ["text {}".format(i) for i in range(2000)]
+    expected = embedder.get_encodings(texts)
+    embedder.dump()
+
+    reloaded = CountingEmbedder(str(tmpdir), model_name="counting")
+    assert len(reloaded.cache) == len(texts)
+    encoded = reloaded.get_encodings(texts)
+    assert reloaded.encoded_texts == []
+    assert all(np.array_equal(e, v) for e, v in zip(expected, encoded))
+
+    reloaded.clear_cache()
+    assert len(reloaded.cache) == 0
+    assert len(CountingEmbedder(str(tmpdir), model_name="counting").cache) == 0
+
+
+def test_embedder_cache_dump_appends_new_entries(tmpdir):
+    embedder = CountingEmbedder(str(tmpdir), model_name="counting")
+    embedder.get_encodings(["one", "two"])
+    embedder.dump()
+    size = os.path.getsize(embedder.cache_path)
+
+    embedder.dump()
+    assert os.path.getsize(embedder.cache_path) == size
+
+    embedder.get_encodings(["three"])
+    embedder.dump()
+    assert os.path.getsize(embedder.cache_path) > size
+
+    reloaded = CountingEmbedder(str(tmpdir), model_name="counting")
+    assert len(reloaded.cache) == 3
+    reloaded.get_encodings(["one", "two", "three"])
+    assert reloaded.encoded_texts == []
+
+
+def test_embedder_cache_fp16(tmpdir):
+    embedder = CountingEmbedder(str(tmpdir), model_name="counting", fp16=True)
+    embedder.get_encodings(["hello"])
+    assert embedder.cache.get("hello").dtype == np.float16
+
+
+def test_get_encodings_normalize_cache_keys(tmpdir):
+    embedder = CountingEmbedder(
+        str(tmpdir), model_name="counting", normalize_cache_keys=True
+    )
+    embedder.get_encodings(["Book a  flight", "book a flight"])
+    embedder.get_encodings([" BOOK A FLIGHT "])
+
+    assert embedder.encoded_texts == ["Book a  flight"]
+
+
+def test_embedder_cache_evicts_least_recently_used(tmpdir):
+    embedder = CountingEmbedder(str(tmpdir), model_name="counting", max_cache_size=2)
+    embedder.get_encodings(["a", "bb"])
+    embedder.get_encodings(["a", "ccc"])
+    assert "bb" not in embedder.cache
+    assert "a" in embedder.cache and "ccc" in embedder.cache
+    embedder.dump()
+
+    reloaded = CountingEmbedder(str(tmpdir), model_name="counting", max_cache_size=2)
+    assert len(reloaded.cache) == 2
+    encoded = reloaded.get_encodings(["a", "ccc"])
+    assert reloaded.encoded_texts == []
+    assert [vec[0] for vec in encoded] == [1.0, 3.0]
+
+
+def test_get_encodings_empty(tmpdir):
+    embedder = CountingEmbedder(str(tmpdir), model_name="counting")
+    assert embedder.get_encodings([]).shape == (0, 0)
+    embedder.get_encodings(["hello"])
+    assert embedder.get_encodings([]).shape == (0, 2)
+
+
+def test_embedder_cache_bounds_entries_pending_dump(tmpdir):
+    embedder = CountingEmbedder(str(tmpdir), model_name="counting", max_cache_size=5)
+    for i in range(100):
+        embedder.get_encodings(["query {}".format(i)])
+    assert len(embedder.cache) == 5
+    assert len(embedder.cache._pending) == 5
+
+
+def test_embedder_cache_eviction_keeps_dumped_rows(tmpdir):
+    embedder = CountingEmbedder(str(tmpdir), model_name="counting")
+    embedder.get_encodings(["a", "bb", "ccc"])
+    embedder.dump()
+
+    # Evict entries without dumping, as a serving process does
+    embedder = CountingEmbedder(str(tmpdir), model_name="counting", max_cache_size=3)
+    embedder.get_encodings(["dddd", "eeeee"])
+
+    reloaded = CountingEmbedder(str(tmpdir), model_name="counting")
+    encoded = reloaded.get_encodings(["a", "bb", "ccc"])
+    assert reloaded.encoded_texts == []
+    assert [vec[0] for vec in encoded] == [1.0, 2.0, 3.0]
+
+
+def test_embedder_cache_invalid_max_size(tmpdir):
+    with pytest.raises(ValueError):
+        CountingEmbedder(str(tmpdir), model_name="counting", max_cache_size=0)
+
+
+def test_embedder_cache_shared_between_instances(tmpdir):
+    embedder = CountingEmbedder(str(tmpdir), model_name="counting")
+    embedder.get_encodings(["a"])
+    embedder.dump()
+
+    first = CountingEmbedder(str(tmpdir), model_name="counting")
+    second = CountingEmbedder(str(tmpdir), model_name="counting")
+    second.get_encodings(["doc"])
+    second.dump()
+    first.get_encodings(["query text"])
+    first.dump()
+
+    reloaded = CountingEmbedder(str(tmpdir), model_name="counting")
+    encoded = reloaded.get_encodings(["a", "doc", "query text"])
+    assert reloaded.encoded_texts == []
+    assert [vec[0] for vec in encoded] == [1.0, 3.0, 10.0]
+
+
+def test_embedder_cache_rewrite_keeps_entries_of_other_instances(tmpdir):
+    # The embedder of a question answerer is created before load_kb creates its own one
+    serving = CountingEmbedder(str(tmpdir), model_name="counting")
+    loader = CountingEmbedder(str(tmpdir), model_name="counting")
+    docs = ["doc {}".format(i) for i in range(1000)]
+    loader.get_encodings(docs)
+    loader.dump()
+
+    serving.get_encodings(["query"])
+    serving.dump()
+
+    reloaded = CountingEmbedder(str(tmpdir), model_name="counting")
+    assert len(reloaded.cache) == len(docs) + 1
+    reloaded.get_encodings(docs + ["query"])
+    assert reloaded.encoded_texts == []
+
+
+def test_embedder_cache_converts_dtype(tmpdir):
+    embedder = CountingEmbedder(str(tmpdir), model_name="counting")
+    embedder.get_encodings(["hello"])
+    embedder.dump()
+
+    reloaded = CountingEmbedder(str(tmpdir), model_name="counting", fp16=True)
+    assert reloaded.cache.get("hello").dtype == np.float16
+    assert reloaded.get_encodings(["hello"]).dtype == np.float16
+    reloaded.dump()
+
+    reloaded = CountingEmbedder(str(tmpdir), model_name="counting", fp16=True)
+    assert reloaded.cache._matrix.dtype == np.float16
+    assert reloaded.get_encodings(["hello"])[0][0] == 5.0
+    assert reloaded.encoded_texts == []
+
+
+class StubSentenceTransformer:
+    """A stand-in for a Sentence-BERT model which embeds texts by their word count"""
+
+    def __init__(self):
+        self.encoded_batches = []
+
+    def encode(self, sentences, batch_size, show_progress_bar, convert_to_numpy):
+        del batch_size, show_progress_bar, convert_to_numpy
+        self.encoded_batches.append(list(sentences))
+        return np.array([[float(len(text.split())), 1.0] for text in sentences])
+
+
+class StubBertEmbedder(BertEmbedder):
+    """A BertEmbedder running the stub model"""
+
+    def load(self, **kwargs):
+        self.batch_size = kwargs.get("batch_size", self.DEFAULT_BATCH_SIZE)
+        self.fp16 = kwargs.get("fp16", False)
+        self.onnx_session = None
+        self.pool = None
+        return StubSentenceTransformer()
+
+
+def test_bert_embedder_encode_restores_order(tmpdir):
+    embedder = StubBertEmbedder(str(tmpdir), model_name="stub")
+    texts = ["a b c", "a", "a b c d", "a b"]
+    encoded = embedder.encode(texts)
+
+    assert embedder.model.encoded_batches == [["a", "a b", "a b c", "a b c d"]]
+    assert [vec[0] for vec in encoded] == [3.0, 1.0, 4.0, 2.0]
+    assert encoded.dtype == np.float64
+
+
+def test_bert_embedder_encode_fp16(tmpdir):
+    embedder = StubBertEmbedder(str(tmpdir), model_name="stub", fp16=True)
+    encoded = embedder.encode(["a b", "a"])
+    assert encoded.dtype == np.float16
+    assert [vec[0] for vec in encoded] == [2.0, 1.0]
+
+
+def test_bert_embedder_encode_empty(tmpdir):
+    embedder = StubBertEmbedder(str(tmpdir), model_name="stub")
+    assert len(embedder.encode([])) == 0
+    assert embedder.model.encoded_batches == []
+
+
+class StubTensor(np.ndarray):
+    """A numpy array with the numpy() method of torch tensors"""
+
+    def numpy(self):
+        return np.asarray(self)
+
+
+class StubTokenizer:
+    """A whitespace tokenizer mimicking the transformers tokenizer API"""
+
+    is_fast = False
+
+    def save_pretrained(self, path):
+        del path
+
+    def tokenize(self, text):
+        return text.split()
+
+    def convert_tokens_to_ids(self, tokens):
+        return [len(token) for token in tokens]
+
+    def prepare_for_model(self, ids, max_length, pad_to_max_length, return_tensors):
+        del pad_to_max_length, return_tensors
+        padding = [0] * (max_length - len(ids))
+        return {
+            "input_ids": np.array([ids + padding]).view(StubTensor),
+            "attention_mask": np.array([[1] * len(ids) + padding]).view(StubTensor),
+        }
+
+
+class StubFastTokenizer(StubTokenizer):
+    is_fast = True
+
+
+class StubFastTokenizerWithoutPrepare(StubFastTokenizer):
+    prepare_for_model = property()
+
+
+class StubTransformer:
+    """A stand-in for the sentence-transformers BERT module"""
+
+    def __init__(self):
+        self.tokenizer = StubTokenizer()
+        self.bert = type("StubBert", (), {"config": None})()
+
+    def tokenize(self, text):
+        return self.tokenizer.convert_tokens_to_ids(self.tokenizer.tokenize(text))
+
+    def get_sentence_features(self, tokens, pad_seq_length):
+        return self.tokenizer.prepare_for_model(
+            tokens,
+            max_length=pad_seq_length + 2,
+            pad_to_max_length=True,
+            return_tensors="pt",
+        )
+
+
+class StubPooling:
+    """A stand-in for the sentence-transformers pooling module"""
+
+    def __init__(self, pooling_mode_mean_tokens=True):
+        self.pooling_mode_mean_tokens = pooling_mode_mean_tokens
+        self.pooling_output_dimension = 2
+        self.word_embedding_dimension = 2
+
+
+class StubModel:
+    """A stand-in for a Sentence-BERT model made of the given modules"""
+
+    def __init__(self, *modules):
+        self.modules = modules
+
+    def __len__(self):
+        return len(self.modules)
+
+    def _first_module(self):
+        return self.modules[0]
+
+    def _last_module(self):
+        return self.modules[-1]
+
+
+class StubOnnxSession:
+    """A stand-in for an ONNX Runtime session running BERT, which embeds each token as its id
+    and position"""
+
+    def run(self, output_names, inputs):
+        del output_names
+        input_ids = inputs["input_ids"]
+        positions = np.broadcast_to(np.arange(input_ids.shape[1]), input_ids.shape)
+        return [np.stack([input_ids, positions], axis=-1).astype(np.float32)]
+
+
+@pytest.mark.parametrize(
+    "fast_tokenizer_class, is_swapped",
+    [(StubFastTokenizer, True), (StubFastTokenizerWithoutPrepare, False)],
+)
+def test_bert_embedder_use_fast_tokenizer(
+    monkeypatch, fast_tokenizer_class, is_swapped
+):
+    fast_tokenizer = fast_tokenizer_class()
+    monkeypatch.setattr(
+        embedder_models,
+        "AutoTokenizer",
+        type(
+            "StubAutoTokenizer", (), {"from_pretrained": lambda *a, **k: fast_tokenizer}
+        ),
+        raising=False,
+    )
+    transformer = StubTransformer()
+    model = StubModel(transformer)
+
+    BertEmbedder._use_fast_tokenizer(model)
+    assert (transformer.tokenizer is fast_tokenizer) == is_swapped
+
+
+def test_bert_embedder_encode_onnx(tmpdir):
+    embedder = StubBertEmbedder(str(tmpdir), model_name="stub", batch_size=2)
+    embedder.model = StubModel(StubTransformer(), StubPooling())
+    embedder.onnx_session = StubOnnxSession()
+
+    # "dddd" is padded to the length of "ee ff" in the first batch, and "a bb ccc" is encoded
+    # in a second batch. Each embedding is the mean id and position of the unpadded tokens.
+    encoded = embedder.encode(["a bb ccc", "dddd", "ee ff"])
+    assert encoded.tolist() == [[2.0, 1.0], [4.0, 0.0], [2.0, 0.5]]
+
+
+def test_bert_embedder_onnx_unsupported_models(tmpdir, monkeypatch):
+    monkeypatch.setattr(embedder_models, "Pooling", StubPooling, raising=False)
+    embedder = StubBertEmbedder(str(tmpdir), model_name="stub")
+    transformer = StubTransformer()
+
+    monkeypatch.setattr(embedder_models, "onnx_available", False)
+    model = StubModel(transformer, StubPooling())
+    assert embedder._load_onnx_session(model, "stub") is None
+
+    monkeypatch.setattr(embedder_models, "onnx_available", True)
+    for model in (
+        StubModel(transformer),
+        StubModel(object(), StubPooling()),
+        StubModel(transformer, StubPooling(pooling_mode_mean_tokens=False)),
+    ):
+        assert embedder._load_onnx_session(model, "stub") is None